@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 import uuid
@@ -13,21 +14,34 @@ sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 os.environ["PYTHONIOENCODING"] = "utf-8"
 
-from app.database import get_db, engine, Base
+from app.database import get_db, engine, Base, SessionLocal
 from app.models import Article, Banner, PageContent, Project, Document, Vacancy, Contact, Appeal
 from app.admin import init_admin  # Импортируем функцию инициализации
+from app.middleware import JSONCharsetMiddleware, JSONCompressionMiddleware
+from app.snapshots import SnapshotPublisher, SnapshotMiddleware
 
 # Создаем папки если не существуют
 os.makedirs("dosc", exist_ok=True)
 os.makedirs("static/uploads", exist_ok=True)
 
+# Каталог JSON-снимков публичных эндпоинтов (можно отдавать через nginx)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+snapshot_publisher = SnapshotPublisher(SNAPSHOT_DIR, SessionLocal)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    snapshot_publisher.start()
+    yield
+    snapshot_publisher.stop()
+
 # Создаем таблицы в БД
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="ЦОДД API",
     description="API для системы ЦОДД Смоленской области", 
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Монтируем статические файлы
@@ -37,6 +51,9 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Инициализируем админку
 init_admin(app)
 
+# Готовые снимки отдаются до обработчиков, CORS оборачивает и их
+app.add_middleware(SnapshotMiddleware, publisher=snapshot_publisher)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -46,14 +63,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Мидлварь для установки кодировки всех ответов
-@app.middleware("http")
-async def add_charset_header(request, call_next):
-    response = await call_next(request)
-    if hasattr(response, 'headers') and 'content-type' in response.headers:
-        if 'application/json' in response.headers['content-type'] and 'charset' not in response.headers['content-type']:
-            response.headers['content-type'] = 'application/json; charset=utf-8'
-    return response
+# Кодировка и сжатие JSON-ответов (чистый ASGI, без BaseHTTPMiddleware)
+app.add_middleware(JSONCharsetMiddleware)
+app.add_middleware(JSONCompressionMiddleware, minimum_size=1024)
 
 @app.get("/")
 def read_root():
@@ -432,6 +444,54 @@ def get_projects(is_free: Optional[bool] = None, db: Session = Depends(get_db)):
     
     return format_response(response_data)
 
+# СНИМКИ ПУБЛИЧНЫХ ЭНДПОИНТОВ
+NEWS_PAGE_LIMIT = 10
+
+def news_list_variants(db: Session):
+    """Все страницы ленты новостей: общей и по каждой категории"""
+    query = db.query(Article).filter(Article.published_at != None)
+    categories = [None] + [
+        row[0] for row in query.with_entities(Article.category).distinct() if row[0]
+    ]
+    for category in categories:
+        category_query = query.filter(Article.category == category) if category else query
+        pages = max(1, (category_query.count() + NEWS_PAGE_LIMIT - 1) // NEWS_PAGE_LIMIT)
+        for page in range(1, pages + 1):
+            params = {}
+            if category:
+                params["category"] = category
+            if page > 1:
+                params["page"] = page
+            yield params
+
+def news_detail_variants(db: Session):
+    for (article_id,) in db.query(Article.id):
+        yield {"article_id": article_id}
+
+def documents_variants(db: Session):
+    yield {}
+    categories = db.query(Document.category).filter(Document.is_active == True).distinct()
+    for (category,) in categories:
+        if category:
+            yield {"category": category}
+
+def projects_variants(db: Session):
+    yield {}
+    yield {"is_free": True}
+    yield {"is_free": False}
+
+snapshot_publisher.register("/api/main-page", get_main_page, models=(Article, Banner, PageContent))
+snapshot_publisher.register("/api/news", get_news_list, models=(Article,), variants=news_list_variants)
+snapshot_publisher.register("/api/news/{article_id}", get_news_detail, models=(Article,), variants=news_detail_variants)
+snapshot_publisher.register("/api/vacancies", get_vacancies, models=(Vacancy,))
+snapshot_publisher.register("/api/contacts", get_contacts, models=(Contact,))
+snapshot_publisher.register("/api/services", get_services, models=(PageContent, Project))
+snapshot_publisher.register("/api/about", get_about_page, models=(PageContent,))
+snapshot_publisher.register("/api/documents", get_documents, models=(Document,), variants=documents_variants)
+snapshot_publisher.register("/api/banners", get_banners, models=(Banner,))
+snapshot_publisher.register("/api/projects", get_projects, models=(Project,), variants=projects_variants)
+snapshot_publisher.watch()
+
 # Health check
 @app.get("/api/health")
 def health_check():
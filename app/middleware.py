@@ -0,0 +1,243 @@
+# app/middleware.py
+"""ASGI-мидлвари для JSON-ответов: кодировка и сжатие.
+
+Написаны без BaseHTTPMiddleware: работают прямо с сообщениями ASGI,
+не создают лишних задач и потоков памяти на каждый запрос.
+"""
+import gzip
+import hashlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # без brotli остаются zstd и gzip
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # без zstandard остаются brotli и gzip
+    zstandard = None
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+# Порядок — предпочтение сервера при равных q у клиента
+COMPRESSORS = OrderedDict()
+if zstandard is not None:
+    COMPRESSORS["zstd"] = zstandard.ZstdCompressor(level=3).compress
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=5)
+COMPRESSORS["gzip"] = _gzip
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Разбирает Accept-Encoding в словарь {кодировка: q}"""
+    encodings = {}
+    for item in header.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[name] = q
+    return encodings
+
+
+def negotiate_encoding(header: str, available) -> str | None:
+    """Выбирает кодировку из ``available`` с наибольшим q у клиента"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _header(headers, name: bytes) -> bytes | None:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def not_modified(request_headers, etag: bytes) -> bool:
+    """Совпадает ли ``etag`` с одним из значений If-None-Match запроса"""
+    if_none_match = _header(request_headers, b"if-none-match")
+    if if_none_match is None:
+        return False
+    for candidate in if_none_match.split(b","):
+        candidate = candidate.strip()
+        if candidate.startswith(b"W/"):
+            candidate = candidate[2:]
+        if candidate in (b"*", etag):
+            return True
+    return False
+
+
+class JSONCharsetMiddleware:
+    """Добавляет ``charset=utf-8`` к ``application/json`` без charset"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_charset(message):
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                for i, (key, value) in enumerate(headers):
+                    if key.lower() == b"content-type":
+                        if value.startswith(b"application/json") and b"charset" not in value:
+                            headers = list(headers)
+                            headers[i] = (key, value + b"; charset=utf-8")
+                            message["headers"] = headers
+                        break
+            await send(message)
+
+        await self.app(scope, receive, send_with_charset)
+
+
+class JSONCompressionMiddleware:
+    """Сжимает JSON-ответы больше ``minimum_size`` байт.
+
+    Кодировка (zstd, br или gzip) выбирается по Accept-Encoding. Сжимаются
+    только полные ответы 200 без ``Content-Encoding`` и ``Content-Range``.
+    Ответам без ETag он назначается по хэшу тела, на ``If-None-Match``
+    отвечаем 304 — только для GET и HEAD. Сжатое тело хранится в LRU-кэше
+    по ключу (путь, запрос, ETag, кодировка), а к ETag добавляется суффикс
+    кодировки. HEAD под ``prefix`` обрабатывается как GET без тела, чтобы
+    заголовки совпадали; остальные HEAD-запросы проходят без изменений.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, cache_size: int = 256, prefix: str = "/api/"):
+        self.app = app
+        self.prefix = prefix
+        self.minimum_size = minimum_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        head = scope["method"] == "HEAD"
+        if head:
+            if not scope["path"].startswith(self.prefix):
+                await self.app(scope, receive, send)
+                return
+            scope = {**scope, "method": "GET"}
+        accept_encoding = _header(scope["headers"], b"accept-encoding")
+        encoding = negotiate_encoding(accept_encoding.decode("latin-1"), COMPRESSORS) if accept_encoding else None
+        request = (scope, encoding, head)
+
+        start_message = None
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                if self._compressible(message):
+                    start_message = message
+                    return
+            elif message["type"] == "http.response.body":
+                if start_message is not None:
+                    chunks.append(message.get("body", b""))
+                    if not message.get("more_body", False):
+                        await self._send_body(send, request, start_message, b"".join(chunks))
+                    return
+                if head:
+                    if not message.get("more_body", False):
+                        await send({"type": "http.response.body", "body": b""})
+                    return
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _compressible(start_message) -> bool:
+        headers = start_message.get("headers", [])
+        content_type = _header(headers, b"content-type") or b""
+        return (
+            start_message["status"] == 200
+            and content_type.startswith(b"application/json")
+            and _header(headers, b"content-encoding") is None
+            and _header(headers, b"content-range") is None
+        )
+
+    async def _send_body(self, send, request, start_message, body):
+        scope, encoding, head = request
+        original_headers = start_message.get("headers", [])
+        headers = [
+            (key, value) for key, value in original_headers
+            if key.lower() not in (b"content-length", b"etag", b"vary")
+        ]
+        cacheable = scope["method"] == "GET"  # HEAD сюда приходит уже как GET
+        etag = _header(original_headers, b"etag")
+        if etag is None and cacheable:
+            etag = b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+        vary = _header(original_headers, b"vary")
+        status = start_message["status"]
+
+        large = len(body) >= self.minimum_size
+        if encoding is not None and large:
+            body = self._compress(scope, body, encoding, etag)
+            if etag is not None:
+                etag = self._encoded_etag(etag, encoding)
+            headers.append((b"content-encoding", encoding.encode()))
+        if large:
+            if vary is None:
+                vary = b"Accept-Encoding"
+            elif b"accept-encoding" not in vary.lower():
+                vary += b", Accept-Encoding"
+        if vary is not None:
+            headers.append((b"vary", vary))
+        if etag is not None:
+            headers.append((b"etag", etag))
+
+        if cacheable and not_modified(scope["headers"], etag):
+            status, body = 304, b""
+            headers = [
+                (key, value) for key, value in headers
+                if key.lower() not in (b"content-type", b"content-encoding")
+            ]
+        else:
+            headers.append((b"content-length", str(len(body)).encode()))
+
+        await send({**start_message, "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if head else body})
+
+    def _compress(self, scope, body, encoding, etag):
+        if etag is None:
+            return COMPRESSORS[encoding](body)
+        key = (scope["path"], scope.get("query_string", b""), etag, encoding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = COMPRESSORS[encoding](body)
+            self.cache[key] = compressed
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return compressed
+
+    @staticmethod
+    def _encoded_etag(etag: bytes, encoding: str) -> bytes:
+        # У сжатого представления должен быть свой ETag: "abc" -> "abc-gzip"
+        if etag.endswith(b'"'):
+            return etag[:-1] + b"-" + encoding.encode() + b'"'
+        return etag + b"-" + encoding.encode()
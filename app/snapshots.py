@@ -0,0 +1,394 @@
+# app/snapshots.py
+"""Публикация JSON-снимков публичных GET-эндпоинтов.
+
+Данные главной страницы, новостей, услуг и т.п. меняются только при
+сохранении в админке, поэтому ответы заранее рендерятся в статические
+файлы ``.json`` (плюс ``.json.gz`` и ``.json.br``). Снимки отдаёт
+``SnapshotMiddleware`` или nginx напрямую, а обычные обработчики
+остаются запасным вариантом, если файла нет.
+
+Раскладка каталога::
+
+    snapshots/
+      current -> 20241019T120000-1a2b3c   # симлинк на последнюю версию
+      20241019T120000-1a2b3c/
+        api/about.json
+        api/news.json
+        api/news@page=2.json
+        api/news/<id>.json
+        .manifest.json                    # какие файлы принадлежат эндпоинту
+
+Строка запроса (если есть) отсортирована и добавляется к имени через ``@``.
+"""
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.responses import FileResponse, Response
+
+from app.middleware import negotiate_encoding, not_modified
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен, без него пишем только gzip
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MEDIA_TYPE = "application/json; charset=utf-8"
+SNAPSHOT_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+MANIFEST_NAME = ".manifest.json"
+LOCK_NAME = ".lock"
+
+
+def render_json(data) -> bytes:
+    """Сериализует ответ так же, как это делает JSONResponse"""
+    return json.dumps(
+        jsonable_encoder(data),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def encode_query(params: dict) -> str:
+    """Каноничная строка запроса: ключи по алфавиту, bool в нижнем регистре"""
+    items = []
+    for key, value in sorted(params.items()):
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        items.append((key, str(value)))
+    return urlencode(items)
+
+
+def snapshot_name(path: str, query: str = "") -> str:
+    """Относительное имя файла снимка для пути и строки запроса"""
+    name = path.strip("/")
+    if query:
+        name += "@" + query
+    return name + ".json"
+
+
+class SnapshotPublisher:
+    """Рендерит зарегистрированные эндпоинты в каталог снимков.
+
+    Перестроение запускается в фоновом потоке после коммита, который
+    затронул хотя бы одну из моделей, указанных при регистрации.
+    Несколько коммитов подряд склеиваются в одно перестроение, а
+    рендерятся заново только эндпоинты, зависящие от изменённых моделей:
+    файлы остальных жёстко связываются из предыдущей версии.
+
+    Сборка, переключение ``current`` и очистка выполняются под файловой
+    блокировкой, поэтому несколько процессов (``--workers``, ``--reload``)
+    могут публиковать в один каталог. Без ``fcntl`` (Windows) блокировка
+    действует только внутри процесса: там запускайте один воркер.
+    """
+
+    def __init__(self, directory: str, session_factory, delay: float = 0.5):
+        self.directory = directory
+        self.session_factory = session_factory
+        self.delay = delay
+        self.endpoints = []
+        self.models = set()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._process_lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def current_dir(self) -> str:
+        return os.path.join(self.directory, "current")
+
+    def register(self, path: str, handler, models=(), variants=None):
+        """Регистрирует эндпоинт.
+
+        ``handler`` вызывается как ``handler(db=db, **params)``.
+        ``variants(db)`` возвращает наборы параметров: ключи из шаблона
+        пути (``{article_id}``) подставляются в путь, остальные уходят в
+        строку запроса. Без ``variants`` рендерится один вариант без параметров.
+        """
+        self.endpoints.append((path, handler, variants, frozenset(models)))
+        self.models.update(models)
+
+    # Публикация
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            with self._process_lock:
+                yield
+            return
+        with open(os.path.join(self.directory, LOCK_NAME), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def build(self, changed=None):
+        """Публикует новую версию снимков и переключает на неё ``current``.
+
+        ``changed`` — множество изменённых моделей; ``None`` означает
+        полную пересборку.
+        """
+        with self._locked():
+            previous = os.readlink(self.current_dir) if os.path.islink(self.current_dir) else None
+            previous_manifest = self._read_manifest(previous)
+
+            version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+            target = os.path.join(self.directory, version)
+            os.makedirs(target)
+            manifest = {}
+
+            db = None
+            try:
+                for path, handler, variants, models in self.endpoints:
+                    reuse = changed is not None and not (models & changed) and path in previous_manifest
+                    if reuse:
+                        self._link_files(previous, target, previous_manifest[path])
+                        manifest[path] = previous_manifest[path]
+                        continue
+                    if db is None:
+                        db = self.session_factory()
+                    manifest[path] = [
+                        self._write_variant(target, path, handler, params, db)
+                        for params in (variants(db) if variants else [{}])
+                    ]
+                with open(os.path.join(target, MANIFEST_NAME), "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, ensure_ascii=False)
+            except Exception:
+                shutil.rmtree(target, ignore_errors=True)
+                raise
+            finally:
+                if db is not None:
+                    db.close()
+
+            self._switch_current(version)
+            self._cleanup(keep={version, previous})
+        logger.info("Снимки опубликованы: %s", version)
+
+    def _read_manifest(self, version):
+        if version is None:
+            return {}
+        try:
+            with open(os.path.join(self.directory, version, MANIFEST_NAME), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _link_files(self, source_version, target, names):
+        source = os.path.join(self.directory, source_version)
+        for name in names:
+            for suffix in ("", *SNAPSHOT_SUFFIXES.values()):
+                source_path = os.path.join(source, name + suffix)
+                if not os.path.isfile(source_path):
+                    continue
+                target_path = os.path.join(target, name + suffix)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                try:
+                    os.link(source_path, target_path)
+                except OSError:
+                    shutil.copy2(source_path, target_path)
+
+    def _write_variant(self, target, path, handler, params, db):
+        """Рендерит один вариант эндпоинта, возвращает имя файла снимка"""
+        params = dict(params)
+        url_path = path
+        for key in list(params):
+            placeholder = "{" + key + "}"
+            if placeholder in url_path:
+                url_path = url_path.replace(placeholder, str(params[key]))
+
+        query_params = {key: value for key, value in params.items() if "{" + key + "}" not in path}
+        body = render_json(handler(db=db, **params))
+
+        name = snapshot_name(url_path, encode_query(query_params))
+        file_path = os.path.join(target, name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(body)
+        with open(file_path + ".gz", "wb") as f:
+            f.write(gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(file_path + ".br", "wb") as f:
+                f.write(brotli.compress(body, quality=6))
+        return name
+
+    def _switch_current(self, version):
+        tmp_link = f"{self.current_dir}.{uuid.uuid4().hex}.tmp"
+        os.symlink(version, tmp_link)
+        os.replace(tmp_link, self.current_dir)
+
+    def _cleanup(self, keep):
+        # Предыдущую версию оставляем: её ещё может дочитывать nginx
+        for name in os.listdir(self.directory):
+            full_path = os.path.join(self.directory, name)
+            if name in keep or name == "current":
+                continue
+            if os.path.islink(full_path):
+                os.remove(full_path)  # ссылки, оставшиеся от упавших процессов
+            elif os.path.isdir(full_path):
+                shutil.rmtree(full_path, ignore_errors=True)
+
+    # Фоновое перестроение
+
+    def schedule(self, changed=None):
+        """Запрашивает перестроение снимков (``None`` — полное)"""
+        with self._pending_lock:
+            if changed is None or self._pending is None:
+                self._pending = None
+            else:
+                self._pending |= changed
+        self._wakeup.set()
+
+    def start(self):
+        """Снимает старые снимки и запускает полную публикацию в фоне.
+
+        Пока её нет, отвечают обычные обработчики: снимки прошлого запуска
+        могут не учитывать изменения, сделанные в БД в обход приложения.
+        """
+        if self._thread is not None:
+            return
+        self._unpublish()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="snapshot-publisher", daemon=True)
+        self._thread.start()
+        self.schedule()
+
+    def stop(self, timeout: float = 10):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Публикация снимков не завершилась за %s с", timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Сбрасываем до паузы: коммиты во время паузы попадут в эту сборку,
+            # а сигнал остановки не потеряется
+            self._wakeup.clear()
+            if self._stopped.wait(self.delay):
+                return
+            with self._pending_lock:
+                changed, self._pending = self._pending, set()
+            if changed is not None and not changed:
+                continue  # всё уже учтено предыдущей сборкой
+            try:
+                self.build(changed)
+            except Exception:
+                # Снимки не обновились — запросы уйдут в обычные обработчики,
+                # а следующая сборка будет полной
+                logger.exception("Не удалось опубликовать снимки")
+                self._unpublish()
+
+    def _unpublish(self):
+        with self._locked():
+            if os.path.islink(self.current_dir):
+                os.remove(self.current_dir)
+
+    # Отслеживание изменений моделей
+
+    def watch(self):
+        """Подписывается на коммиты всех сессий SQLAlchemy, включая админку"""
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+
+    def _after_flush(self, session, flush_context):
+        changed = session.info.setdefault("snapshot_changed", set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            changed.add(type(obj))
+
+    def _after_commit(self, session):
+        changed = session.info.pop("snapshot_changed", set()) & self.models
+        if changed:
+            self.schedule(changed)
+
+    def _after_rollback(self, session):
+        session.info.pop("snapshot_changed", None)
+
+
+class SnapshotMiddleware:
+    """ASGI-мидлварь, отдающая опубликованные снимки без обращения к БД.
+
+    Обслуживает только GET/HEAD; если снимка нет, запрос уходит дальше
+    в приложение. Сжатую копию выбирает по ``Accept-Encoding``, на
+    совпавший ``If-None-Match`` отвечает 304.
+    """
+
+    def __init__(self, app, publisher: SnapshotPublisher, prefix: str = "/api/"):
+        self.app = app
+        self.publisher = publisher
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        file_path = self._lookup(path, scope.get("query_string", b""))
+        if file_path is None:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        available = [
+            encoding for encoding, suffix in SNAPSHOT_SUFFIXES.items()
+            if os.path.isfile(file_path + suffix)
+        ]
+        encoding = negotiate_encoding(accept_encoding, available)
+
+        headers = {"Vary": "Accept-Encoding"}
+        if encoding is not None:
+            file_path += SNAPSHOT_SUFFIXES[encoding]
+            headers["Content-Encoding"] = encoding
+
+        try:
+            stat_result = os.stat(file_path)
+        except FileNotFoundError:  # версию только что удалила очистка
+            await self.app(scope, receive, send)
+            return
+
+        response = FileResponse(file_path, media_type=SNAPSHOT_MEDIA_TYPE, headers=headers, stat_result=stat_result)
+        etag = response.headers["etag"]
+        if not_modified(scope["headers"], etag.encode("latin-1")):
+            response = Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+        await response(scope, receive, send)
+
+    def _lookup(self, path, query_string):
+        if not path.startswith(self.prefix) or path.endswith("/"):
+            return None
+        if ".." in path.split("/") or "@" in path:
+            return None
+
+        query = encode_query(dict(parse_qsl(query_string.decode("latin-1"))))
+        file_path = os.path.join(self.publisher.current_dir, snapshot_name(path, query))
+        if not os.path.isfile(file_path):
+            return None
+        return file_path
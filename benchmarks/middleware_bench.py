@@ -0,0 +1,96 @@
+# benchmarks/middleware_bench.py
+"""Сравнение накладных расходов мидлвари кодировки на один запрос.
+
+Старый вариант — функция ``@app.middleware("http")`` (BaseHTTPMiddleware),
+новый — ``JSONCharsetMiddleware`` на чистом ASGI. Запросы подаются прямо в
+ASGI-приложение, без сети и сервера, поэтому видна только разница мидлварей.
+
+Запуск:
+    python -m benchmarks.middleware_bench
+"""
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from app.middleware import JSONCharsetMiddleware, JSONCompressionMiddleware
+
+REQUESTS = 5000
+ROUNDS = 7
+PAYLOAD = {"content": {"title": "ЦОДД Смоленской области", "text": "Центр организации дорожного движения " * 50}}
+
+
+def build_app(kind: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/about")
+    def about():
+        return PAYLOAD
+
+    if kind == "base-http":
+        @app.middleware("http")
+        async def add_charset_header(request, call_next):
+            response = await call_next(request)
+            if 'application/json' in response.headers['content-type'] and 'charset' not in response.headers['content-type']:
+                response.headers['content-type'] = 'application/json; charset=utf-8'
+            return response
+    elif kind in ("asgi", "asgi+gzip"):
+        app.add_middleware(JSONCharsetMiddleware)
+        if kind == "asgi+gzip":
+            app.add_middleware(JSONCompressionMiddleware)
+    return app
+
+
+async def run(app, accept_encoding: bytes) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/about",
+        "raw_path": b"/api/about",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"accept-encoding", accept_encoding)],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(200):  # прогрев
+        await app(dict(scope), receive, send)
+
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+def main():
+    # Варианты чередуются по раундам, берётся лучший раунд — так меньше шума
+    variants = (
+        ("none", b""),
+        ("base-http", b""),
+        ("asgi", b""),
+        ("asgi+gzip", b"gzip"),
+    )
+    apps = {kind: build_app(kind) for kind, _ in variants}
+    results = {kind: float("inf") for kind, _ in variants}
+    for _ in range(ROUNDS):
+        for kind, accept_encoding in variants:
+            results[kind] = min(results[kind], asyncio.run(run(apps[kind], accept_encoding)))
+
+    for kind, _ in variants:
+        print(f"{kind:<10} {results[kind]:8.1f} мкс/запрос")
+    print(f"BaseHTTPMiddleware: +{results['base-http'] - results['none']:.1f} мкс, "
+          f"ASGI: +{results['asgi'] - results['none']:.1f} мкс")
+
+
+if __name__ == "__main__":
+    main()
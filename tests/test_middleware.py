@@ -0,0 +1,152 @@
+import asyncio
+import gzip
+import json
+
+from starlette.responses import FileResponse
+
+from app import middleware as middleware_module
+from app.middleware import JSONCharsetMiddleware, JSONCompressionMiddleware, negotiate_encoding
+
+LARGE_BODY = json.dumps({"text": "Центр организации дорожного движения " * 100}, ensure_ascii=False).encode()
+SMALL_BODY = b'{"status":"ok"}'
+
+
+def json_app(bodies, status=200, extra_headers=()):
+    """ASGI-приложение, отдающее тело по пути из ``bodies``"""
+    async def app(scope, receive, send):
+        body = bodies[scope["path"]]
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers + list(extra_headers)})
+        await send({"type": "http.response.body", "body": body[:10], "more_body": True})
+        await send({"type": "http.response.body", "body": body[10:]})
+    return app
+
+
+def request(app, path="/", method="GET", headers=()):
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"", "headers": list(headers)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+GZIP = [(b"accept-encoding", b"gzip")]
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, br", ["zstd", "br", "gzip"]) == "br"
+    assert negotiate_encoding("gzip;q=1, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate_encoding("*;q=0.5, gzip;q=0", ["zstd", "gzip"]) == "zstd"
+    assert negotiate_encoding("identity", ["br", "gzip"]) is None
+    assert negotiate_encoding("", ["gzip"]) is None
+
+
+def test_charset_added_to_json():
+    status, headers, _ = request(JSONCharsetMiddleware(json_app({"/": SMALL_BODY})))
+    assert headers[b"content-type"] == b"application/json; charset=utf-8"
+
+
+def test_large_json_is_compressed():
+    status, headers, body = request(JSONCompressionMiddleware(json_app({"/": LARGE_BODY})), headers=GZIP)
+    assert status == 200
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert headers[b"content-length"] == str(len(body)).encode()
+    assert headers[b"etag"].endswith(b'-gzip"')
+    assert gzip.decompress(body) == LARGE_BODY
+
+
+def test_small_json_is_not_compressed():
+    status, headers, body = request(JSONCompressionMiddleware(json_app({"/": SMALL_BODY})), headers=GZIP)
+    assert body == SMALL_BODY
+    assert b"content-encoding" not in headers
+    assert b"etag" in headers
+
+
+def test_already_encoded_response_is_untouched():
+    app = json_app({"/": LARGE_BODY}, extra_headers=[(b"content-encoding", b"br")])
+    status, headers, body = request(JSONCompressionMiddleware(app), headers=GZIP)
+    assert headers[b"content-encoding"] == b"br"
+    assert body == LARGE_BODY
+
+
+def test_partial_content_is_not_compressed(tmp_path):
+    path = tmp_path / "snapshot.json"
+    path.write_bytes(LARGE_BODY)
+    app = FileResponse(str(path), media_type="application/json")
+    status, headers, body = request(JSONCompressionMiddleware(app), headers=GZIP + [(b"range", b"bytes=0-99")])
+    assert status == 206
+    assert b"content-encoding" not in headers
+    assert body == LARGE_BODY[:100]
+
+
+def test_etag_cache_is_per_url():
+    other_body = LARGE_BODY.replace("Центр".encode(), "Отдел".encode())
+    app = json_app({"/a": LARGE_BODY, "/b": other_body}, extra_headers=[(b"etag", b'"same"')])
+    middleware = JSONCompressionMiddleware(app)
+    _, _, body_a = request(middleware, "/a", headers=GZIP)
+    _, _, body_b = request(middleware, "/b", headers=GZIP)
+    assert gzip.decompress(body_a) == LARGE_BODY
+    assert gzip.decompress(body_b) == other_body
+    assert len(middleware.cache) == 2
+
+
+def test_etag_cache_reuses_compressed_body(monkeypatch):
+    middleware = JSONCompressionMiddleware(json_app({"/": LARGE_BODY}))
+    request(middleware, headers=GZIP)
+    calls = []
+    monkeypatch.setitem(middleware_module.COMPRESSORS, "gzip", lambda body: calls.append(body) or b"")
+    _, _, body = request(middleware, headers=GZIP)
+    assert calls == []
+    assert gzip.decompress(body) == LARGE_BODY
+
+
+def test_if_none_match_returns_not_modified():
+    middleware = JSONCompressionMiddleware(json_app({"/": LARGE_BODY}))
+    _, headers, _ = request(middleware, headers=GZIP)
+    status, not_modified_headers, body = request(
+        middleware, headers=GZIP + [(b"if-none-match", headers[b"etag"])]
+    )
+    assert status == 304
+    assert body == b""
+    assert not_modified_headers[b"etag"] == headers[b"etag"]
+
+
+def test_head_has_same_headers_as_get():
+    middleware = JSONCompressionMiddleware(json_app({"/api/about": LARGE_BODY}))
+    _, get_headers, _ = request(middleware, "/api/about", headers=GZIP)
+    status, head_headers, body = request(middleware, "/api/about", method="HEAD", headers=GZIP)
+    assert status == 200
+    assert head_headers == get_headers
+    assert body == b""
+
+
+def test_head_outside_prefix_is_passed_through():
+    methods = []
+
+    async def app(scope, receive, send):
+        methods.append(scope["method"])
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/pdf")]})
+        await send({"type": "http.response.body", "body": b""})
+
+    request(JSONCompressionMiddleware(app), "/dosc/file.pdf", method="HEAD", headers=GZIP)
+    assert methods == ["HEAD"]
+
+
+def test_post_is_never_not_modified():
+    middleware = JSONCompressionMiddleware(json_app({"/api/appeals": LARGE_BODY}))
+    status, headers, body = request(
+        middleware, "/api/appeals", method="POST", headers=GZIP + [(b"if-none-match", b"*")]
+    )
+    assert status == 200
+    assert b"etag" not in headers
+    assert gzip.decompress(body) == LARGE_BODY
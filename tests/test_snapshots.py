@@ -0,0 +1,148 @@
+import asyncio
+import gzip
+import os
+import time
+
+from app.snapshots import SnapshotMiddleware, SnapshotPublisher, encode_query, snapshot_name
+
+
+class FakeSession:
+    def close(self):
+        pass
+
+
+class Article:
+    pass
+
+
+class Contact:
+    pass
+
+
+def make_publisher(tmp_path, calls):
+    def news_list(db, page=1):
+        calls.append(("news", page))
+        return {"page": page, "title": "Новости"}
+
+    def news_detail(db, article_id):
+        calls.append(("detail", article_id))
+        return {"id": article_id}
+
+    def contacts(db):
+        calls.append(("contacts",))
+        return {"contacts": []}
+
+    publisher = SnapshotPublisher(str(tmp_path / "snapshots"), FakeSession)
+    publisher.register("/api/news", news_list, models=(Article,), variants=lambda db: [{}, {"page": 2}])
+    publisher.register("/api/news/{article_id}", news_detail, models=(Article,), variants=lambda db: [{"article_id": "a1"}])
+    publisher.register("/api/contacts", contacts, models=(Contact,))
+    return publisher
+
+
+def test_encode_query_is_canonical():
+    assert encode_query({"page": 2, "category": "дороги"}) == "category=%D0%B4%D0%BE%D1%80%D0%BE%D0%B3%D0%B8&page=2"
+    assert encode_query({"is_free": True}) == "is_free=true"
+    assert encode_query({}) == ""
+
+
+def test_snapshot_name():
+    assert snapshot_name("/api/about") == "api/about.json"
+    assert snapshot_name("/api/news", "page=2") == "api/news@page=2.json"
+
+
+def test_build_and_lookup_round_trip(tmp_path):
+    publisher = make_publisher(tmp_path, [])
+    publisher.build()
+    middleware = SnapshotMiddleware(None, publisher)
+
+    found = middleware._lookup("/api/news", b"page=2")
+    assert found is not None
+    assert open(found, encoding="utf-8").read() == '{"page":2,"title":"Новости"}'
+    assert gzip.decompress(open(found + ".gz", "rb").read()) == open(found, "rb").read()
+
+    assert middleware._lookup("/api/news", b"") is not None
+    assert middleware._lookup("/api/news/a1", b"") is not None
+    assert middleware._lookup("/api/news", b"page=3") is None
+    assert middleware._lookup("/api/news/", b"") is None
+    assert middleware._lookup("/api/../api/news", b"") is None
+    assert middleware._lookup("/admin", b"") is None
+
+
+def test_incremental_build_links_unchanged_endpoints(tmp_path):
+    calls = []
+    publisher = make_publisher(tmp_path, calls)
+    publisher.build()
+    first = os.path.join(publisher.directory, os.readlink(publisher.current_dir))
+    calls.clear()
+
+    publisher.build({Contact})
+
+    assert calls == [("contacts",)]
+    second = os.path.join(publisher.directory, os.readlink(publisher.current_dir))
+    assert second != first
+    assert os.path.samefile(os.path.join(first, "api/news@page=2.json"), os.path.join(second, "api/news@page=2.json"))
+    assert os.path.isfile(os.path.join(second, "api/contacts.json"))
+
+
+def test_build_keeps_only_current_and_previous_versions(tmp_path):
+    publisher = make_publisher(tmp_path, [])
+    for _ in range(3):
+        publisher.build()
+
+    versions = [
+        name for name in os.listdir(publisher.directory)
+        if os.path.isdir(os.path.join(publisher.directory, name)) and name != "current"
+    ]
+    assert len(versions) == 2
+    assert os.readlink(publisher.current_dir) in versions
+
+
+def test_start_unpublishes_previous_run(tmp_path):
+    publisher = make_publisher(tmp_path, [])
+    publisher.build()
+    publisher.delay = 1
+
+    publisher.start()
+    try:
+        assert not os.path.lexists(publisher.current_dir)
+        assert SnapshotMiddleware(None, publisher)._lookup("/api/contacts", b"") is None
+    finally:
+        publisher.stop()
+
+
+def test_stop_while_waiting_for_delay(tmp_path):
+    publisher = make_publisher(tmp_path, [])
+    publisher.delay = 1
+    publisher.start()
+    thread = publisher._thread
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    publisher.stop()
+
+    assert time.monotonic() - started < 0.5
+    assert not thread.is_alive()
+
+
+def test_precompressed_snapshot_answers_not_modified(tmp_path):
+    publisher = make_publisher(tmp_path, [])
+    publisher.build()
+    middleware = SnapshotMiddleware(None, publisher)
+
+    def get(headers):
+        messages = []
+        scope = {"type": "http", "method": "GET", "path": "/api/news", "query_string": b"page=2", "headers": headers}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(middleware(scope, None, send))
+        return messages[0]["status"], dict(messages[0]["headers"])
+
+    status, headers = get([(b"accept-encoding", b"gzip")])
+    assert status == 200
+    assert headers[b"content-encoding"] == b"gzip"
+
+    status, not_modified_headers = get([(b"accept-encoding", b"gzip"), (b"if-none-match", headers[b"etag"])])
+    assert status == 304
+    assert not_modified_headers[b"etag"] == headers[b"etag"]